@@ -1,23 +1,81 @@
 import os
-import torch
-import whisper
 import json
-from data_processing_common import sanitize_filename
+import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import ctranslate2
+import numpy as np
+from faster_whisper import WhisperModel, decode_audio
+from faster_whisper.vad import get_speech_timestamps
+from file_utils import sanitize_filename
+from cache_utils import file_fingerprint, cache_get, cache_set, SemanticCache
 import re
+import threading
 from rich.console import Console
 
 console = Console()
 
 # Global variable for the Whisper model
 WHISPER_MODEL = None
+WHISPER_MODEL_SIZE = None
 
-def initialize_whisper_model(model_size="base", device="cuda" if torch.cuda.is_available() else "cpu", silent=False):
-    global WHISPER_MODEL
+# Fixed instructions come first and are byte-identical across calls, so Ollama
+# can reuse the KV cache for this prefix and only prefill the transcription.
+PROMPT_PREFIX = """Analyze the following audio transcription and provide a concise description, a suitable folder name (max 2 words, nouns only), and a descriptive filename (max 3 words, nouns only, underscores for spaces). Return the output as a JSON object with keys 'description', 'foldername', and 'filename'.
+
+Example:
+Transcription: This is a recording of a dog barking loudly in a park.
+JSON Output: { "description": "Recording of a dog barking in a park", "foldername": "animal_sounds", "filename": "dog_barking_park" }
+"""
+# Constrains Ollama's output to a JSON object with exactly the keys we read back
+METADATA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "foldername": {"type": "string"},
+        "filename": {"type": "string"}
+    },
+    "required": ["description", "foldername", "filename"]
+}
+# The JSON object is short; cap decoding and keep it deterministic
+GENERATE_OPTIONS = {"num_predict": 128, "temperature": 0}
+# Part of every cache key, so editing the prompt, schema or generation settings invalidates cached results
+PROMPT_HASH = hashlib.md5((PROMPT_PREFIX + json.dumps(METADATA_SCHEMA, sort_keys=True) + json.dumps(GENERATE_OPTIONS, sort_keys=True)).encode('utf-8')).hexdigest()
+
+# Whisper expects 16 kHz mono PCM
+SAMPLE_RATE = 16000
+# Files longer than this (in seconds) are split and transcribed in parallel chunks
+PARALLEL_THRESHOLD_SECONDS = 60
+PARALLEL_CHUNKS = 4
+# Overlap between neighbouring chunks so words at the boundaries keep their context
+CHUNK_OVERLAP_SECONDS = 0.5
+# Ollama requests in flight while the next file is being transcribed
+OLLAMA_WORKERS = 2
+
+# Text Whisper commonly hallucinates on silence or non-speech audio
+_WHISPER_HALLUCINATIONS = frozenset({
+    "", ".", "...", "you", "thank you.", "thank you", "thanks for watching!", "thanks for watching.",
+    "thank you for watching.", "thank you for watching!", "please subscribe.", "subtitles by the amara.org community",
+})
+# Transcriptions with fewer words than this carry no useful signal for naming
+MIN_TRANSCRIPTION_WORDS = 3
+
+# One semantic cache per Ollama model, created on first use
+_semantic_caches = {}
+_semantic_caches_lock = threading.Lock()
+
+def initialize_whisper_model(model_size="base", device="cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu", silent=False):
+    global WHISPER_MODEL, WHISPER_MODEL_SIZE
     if WHISPER_MODEL is None:
         if not silent:
             console.print(f"[bold yellow]Initializing Whisper model ({model_size}) on {device} device...[/bold yellow]")
         try:
-            WHISPER_MODEL = whisper.load_model(model_size, device=device)
+            # FP16 on GPU, INT8 on CPU: CTranslate2 halves memory bandwidth versus FP32
+            compute_type = "float16" if device == "cuda" else "int8"
+            # One worker per parallel chunk so concurrent transcribe() calls share the weights
+            WHISPER_MODEL = WhisperModel(model_size, device=device, compute_type=compute_type, num_workers=PARALLEL_CHUNKS)
+            WHISPER_MODEL_SIZE = model_size
+            _warm_up_whisper_model()
             if not silent:
                 console.print("[bold green]Whisper model initialized successfully![/bold green]")
         except Exception as e:
@@ -25,6 +83,57 @@ def initialize_whisper_model(model_size="base", device="cuda" if torch.cuda.is_a
                 console.print(f"[bold red]Error initializing Whisper model: {e}[/bold red]")
             WHISPER_MODEL = None
 
+def _keep_speech(audio):
+    """Drop silence with the Silero VAD bundled in faster-whisper, keeping only speech samples."""
+    speech = get_speech_timestamps(audio)
+    if not speech:
+        return audio[:0]
+    return np.concatenate([audio[chunk['start']:chunk['end']] for chunk in speech])
+
+def _transcribe_segment(audio):
+    """Transcribe a decoded PCM array with the loaded Whisper model."""
+    # Silence was already removed by _keep_speech, so skip the per-call VAD pass
+    segments, _ = WHISPER_MODEL.transcribe(audio, beam_size=1, vad_filter=False)
+    return "".join(segment.text for segment in segments).strip()
+
+def _warm_up_whisper_model():
+    """Run one second of silence through the model so kernel setup happens before real work."""
+    try:
+        segments, _ = WHISPER_MODEL.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), beam_size=1)
+        list(segments)  # Segments are generated lazily; consume them to force the forward pass
+    except Exception:
+        pass
+
+def _normalize_words(words):
+    return [re.sub(r'[^\w]', '', word).lower() for word in words]
+
+def _merge_overlap(left, right, max_words=10):
+    """Join two transcripts, dropping the words repeated across the chunk overlap."""
+    left_words = left.split()
+    right_words = right.split()
+    left_norm = _normalize_words(left_words[-max_words:])
+    right_norm = _normalize_words(right_words[:max_words])
+    for size in range(min(len(left_norm), len(right_norm)), 0, -1):
+        if left_norm[-size:] == right_norm[:size]:
+            right_words = right_words[size:]
+            break
+    return " ".join(left_words + right_words)
+
+def _transcribe_parallel(audio, P=PARALLEL_CHUNKS):
+    """Split decoded audio into P overlapping windows and transcribe them concurrently."""
+    chunk_length = -(-len(audio) // P)
+    overlap = int(CHUNK_OVERLAP_SECONDS * SAMPLE_RATE)
+    chunks = [
+        audio[max(0, start - overlap):start + chunk_length + overlap]
+        for start in range(0, len(audio), chunk_length)
+    ]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        texts = list(executor.map(_transcribe_segment, chunks))
+    transcription = ""
+    for text in texts:
+        transcription = _merge_overlap(transcription, text) if transcription else text
+    return transcription
+
 def transcribe_audio_with_whisper(audio_path, silent=False):
     if WHISPER_MODEL is None:
         if not silent:
@@ -34,8 +143,15 @@ def transcribe_audio_with_whisper(audio_path, silent=False):
     if not silent:
         console.print(f"[bold blue]Transcribing audio file: {audio_path}...[/bold blue]")
     try:
-        result = WHISPER_MODEL.transcribe(audio_path)
-        transcription = result["text"]
+        # Decode once and trim silence, so the encoder only sees speech;
+        # long files are transcribed as parallel chunks against the same model
+        audio = _keep_speech(decode_audio(audio_path, sampling_rate=SAMPLE_RATE))
+        if len(audio) == 0:
+            transcription = ""
+        elif len(audio) / SAMPLE_RATE > PARALLEL_THRESHOLD_SECONDS:
+            transcription = _transcribe_parallel(audio)
+        else:
+            transcription = _transcribe_segment(audio)
         if not silent:
             console.print(f"[bold green]Transcription complete for {os.path.basename(audio_path)}.[/bold green]")
         return transcription
@@ -45,60 +161,154 @@ def transcribe_audio_with_whisper(audio_path, silent=False):
         return None
 
 
-def process_audio_file_for_ollama(audio_path, ollama_inference_function, silent=False, log_file=None):
-    transcription = transcribe_audio_with_whisper(audio_path, silent=silent)
-    if transcription:
+def _audio_cache_key(audio_path, ollama_inference_function):
+    """Key cached results by file contents, both model names and the prompt hash."""
+    model_name = getattr(ollama_inference_function, 'model_name', '')
+    return f"{file_fingerprint(audio_path)}:{WHISPER_MODEL_SIZE}:{model_name}:{PROMPT_HASH}"
+
+def _lookup_cached_result(audio_path, ollama_inference_function, silent=False):
+    """Return (cache_key, cached_result); cached_result is None on a miss."""
+    try:
+        cache_key = _audio_cache_key(audio_path, ollama_inference_function)
+    except OSError:
+        return None, None
+    cached = cache_get('audio', cache_key)
+    if cached:
         if not silent:
-            console.print(f"[bold cyan]Sending transcription to Ollama for inference: {transcription[:50]}...[/bold cyan]")
-        try:
-            # Prompt Ollama to generate description, folder name, and filename in JSON format
-            prompt = f"""Analyze the following audio transcription and provide a concise description, a suitable folder name (max 2 words, nouns only), and a descriptive filename (max 3 words, nouns only, underscores for spaces). Return the output as a JSON object with keys 'description', 'foldername', and 'filename'.
+            console.print(f"[bold green]Using cached result for {os.path.basename(audio_path)}.[/bold green]")
+        return cache_key, _with_audio_path(cached, audio_path)
+    return cache_key, None
 
-Example:
-Transcription: This is a recording of a dog barking loudly in a park.
-JSON Output: {{ "description": "Recording of a dog barking in a park", "foldername": "animal_sounds", "filename": "dog_barking_park" }}
-
-Transcription: {transcription}
-
-JSON Output:"""
-
-            ollama_result = ollama_inference_function.generate(prompt)
-            
-            # Extract JSON string using regex
-            json_match = re.search(r'\{.*\}', ollama_result, re.DOTALL)
-            if json_match:
-                json_string = json_match.group(0)
-                output_dict = json.loads(json_string)
-            else:
-                raise ValueError(f"Could not find JSON in model output: {ollama_result}")      
-            
-
-            description = output_dict.get('description', '').strip()
-            foldername = sanitize_filename(output_dict.get('foldername', '').strip())
-            filename = sanitize_filename(output_dict.get('filename', '').strip())
+def _with_audio_path(result, audio_path):
+    """Attach audio_path to a cached result; entries stored without a filename are named after the file."""
+    result = dict(result, file_path=audio_path)
+    if 'filename' not in result:
+        result['filename'] = sanitize_filename(os.path.basename(audio_path))
+    return result
+
+def _get_semantic_cache(ollama_inference_function):
+    model_name = getattr(ollama_inference_function, 'model_name', '')
+    with _semantic_caches_lock:
+        if model_name not in _semantic_caches:
+            _semantic_caches[model_name] = SemanticCache('audio_semantic', f"{model_name}:{PROMPT_HASH}")
+        return _semantic_caches[model_name]
+
+def _describe_transcription(audio_path, transcription, ollama_inference_function, cache_key=None, silent=False, log_file=None):
+    """Ask Ollama for a description, folder name and filename for a transcription."""
+    # Silent or non-speech audio gets a fixed name without an Ollama round-trip
+    if len(transcription.split()) < MIN_TRANSCRIPTION_WORDS or transcription.strip().lower() in _WHISPER_HALLUCINATIONS:
+        result = {
+            'transcription': transcription,
+            'description': 'Non-speech or silent audio',
+            'foldername': 'audio_files',
+        }
+        # The cache key only covers contents, so the entry leaves out the
+        # name-derived fields and _lookup_cached_result rebuilds them
+        if cache_key:
+            cache_set('audio', cache_key, result)
+        return _with_audio_path(result, audio_path)
+
+    try:
+        # Near-duplicate transcriptions reuse an earlier answer instead of calling Ollama
+        semantic_cache = _get_semantic_cache(ollama_inference_function)
+        similar = semantic_cache.lookup(transcription)
+        if similar:
             if not silent:
-                console.print("[bold green]Ollama inference complete.[/bold green]")
-            return {
-                'file_path': audio_path,
-                'transcription': transcription,
-                'description': description,
-                'foldername': foldername,
-                'filename': filename
-            }
-        except Exception as e:
-            message = f"Error during Ollama inference for {audio_path}: {e}"
-            if silent:
-                if log_file:
-                    log_file.write(message + '\n')
-            else:
-                console.print(f"[bold red]{message}[/bold red]")
-            return None
+                console.print(f"[bold green]Reusing result of a similar transcription for {os.path.basename(audio_path)}.[/bold green]")
+            result = dict(similar, file_path=audio_path, transcription=transcription)
+            if cache_key:
+                cache_set('audio', cache_key, result)
+            return result
+
+        if not silent:
+            console.print(f"[bold cyan]Sending transcription to Ollama for inference: {transcription[:50]}...[/bold cyan]")
+        # Prompt Ollama to generate description, folder name, and filename in JSON format
+        prompt = PROMPT_PREFIX + f"\nTranscription: {transcription}\n\nJSON Output:"
+
+        ollama_result = ollama_inference_function.generate(prompt, format=METADATA_SCHEMA, options=GENERATE_OPTIONS)
+        # Structured output guarantees valid JSON; a decode error here is a hard failure
+        output_dict = json.loads(ollama_result)
+
+        description = output_dict.get('description', '').strip()
+        foldername = sanitize_filename(output_dict.get('foldername', '').strip())
+        filename = sanitize_filename(output_dict.get('filename', '').strip())
+        if not silent:
+            console.print("[bold green]Ollama inference complete.[/bold green]")
+        result = {
+            'file_path': audio_path,
+            'transcription': transcription,
+            'description': description,
+            'foldername': foldername,
+            'filename': filename
+        }
+        if cache_key:
+            cache_set('audio', cache_key, result)
+        semantic_cache.add(transcription, result)
+        return result
+    except Exception as e:
+        message = f"Error during Ollama inference for {audio_path}: {e}"
+        if silent:
+            if log_file:
+                log_file.write(message + '\n')
+        else:
+            console.print(f"[bold red]{message}[/bold red]")
+        return None
+
+def process_audio_file_for_ollama(audio_path, ollama_inference_function, silent=False, log_file=None):
+    cache_key, cached = _lookup_cached_result(audio_path, ollama_inference_function, silent)
+    if cached:
+        return cached
+
+    transcription = transcribe_audio_with_whisper(audio_path, silent=silent)
+    if transcription is not None:
+        return _describe_transcription(audio_path, transcription, ollama_inference_function, cache_key, silent, log_file)
     return None
 
 def process_audio_files(audio_files, ollama_inference_function, silent=False, log_file=None):
-    processed_data = []
-    for audio_file in audio_files:
-        data = process_audio_file_for_ollama(audio_file, ollama_inference_function, silent, log_file)
-        if data:
-            processed_data.append(data)
-    return processed_data
+    """Transcribe on one Whisper thread while Ollama workers name the finished transcriptions."""
+    results = [None] * len(audio_files)
+    errors = []
+    transcriptions = queue.Queue(maxsize=4)
+
+    def whisper_worker():
+        try:
+            for index, audio_file in enumerate(audio_files):
+                cache_key, cached = _lookup_cached_result(audio_file, ollama_inference_function, silent)
+                if cached:
+                    results[index] = cached
+                    continue
+                transcription = transcribe_audio_with_whisper(audio_file, silent=silent)
+                if transcription is not None:
+                    transcriptions.put((index, audio_file, transcription, cache_key))
+        finally:
+            # One sentinel per Ollama worker so they all stop once the queue drains
+            for _ in range(OLLAMA_WORKERS):
+                transcriptions.put(None)
+
+    def ollama_worker():
+        while True:
+            item = transcriptions.get()
+            if item is None:
+                return
+            index, audio_file, transcription, cache_key = item
+            try:
+                results[index] = _describe_transcription(audio_file, transcription, ollama_inference_function, cache_key, silent, log_file)
+            except Exception as e:
+                # Keep draining so the Whisper thread never blocks on a full queue
+                errors.append(e)
+
+    try:
+        with ThreadPoolExecutor(max_workers=OLLAMA_WORKERS + 1) as executor:
+            futures = [executor.submit(whisper_worker)]
+            futures += [executor.submit(ollama_worker) for _ in range(OLLAMA_WORKERS)]
+            for future in futures:
+                future.result()
+    finally:
+        # Persist new semantic cache entries once per run instead of on every add
+        with _semantic_caches_lock:
+            for semantic_cache in _semantic_caches.values():
+                semantic_cache.save()
+
+    if errors:
+        raise errors[0]
+    return [data for data in results if data]
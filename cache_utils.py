@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Semantic caching is optional
+    SentenceTransformer = None
+
+# Results cached across runs live under the user's cache directory
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "local-file-organizer")
+# Sentence embedding model used to spot near-duplicate texts
+SEMANTIC_MODEL_NAME = "all-MiniLM-L6-v2"
+# Cosine similarity above which two texts are treated as the same content
+SEMANTIC_THRESHOLD = 0.95
+# Newest entries kept on disk per semantic cache; older ones are dropped on save
+SEMANTIC_MAX_ENTRIES = 5000
+# Files larger than twice this size are fingerprinted by their head, tail and size only
+PARTIAL_HASH_BYTES = 1 << 20
+
+def file_fingerprint(file_path):
+    """Return a SHA-256 hex digest identifying the contents of a file."""
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(file_path, 'rb') as f:
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _cache_path(namespace, key, suffix='.json'):
+    name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, namespace, f"{name}{suffix}")
+
+def _atomic_write(path, write, mode='w'):
+    """Write through write(f) to a temp file and rename it over path, so readers never see partial files."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def cache_get(namespace, key):
+    """Return the cached value for key, or None on a miss or unreadable entry."""
+    try:
+        with open(_cache_path(namespace, key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cache_set(namespace, key, value):
+    """Store a JSON-serializable value; the write is atomic so readers never see partial entries."""
+    try:
+        _atomic_write(_cache_path(namespace, key), lambda f: json.dump(value, f))
+    except OSError:
+        # Caching is best effort; a read-only or full disk must not break organizing
+        pass
+
+class SemanticCache:
+    """Reuse results for texts whose embeddings are nearly identical to an earlier one.
+
+    Embeddings are kept in memory as a growing float32 matrix and persisted
+    by save() as an .npy file next to a JSON list of results, keeping only
+    the newest max_entries. Lookups silently miss when sentence-transformers
+    is not installed.
+    """
+    _model = None
+    _model_lock = threading.Lock()
+
+    def __init__(self, namespace, key, threshold=SEMANTIC_THRESHOLD, max_entries=SEMANTIC_MAX_ENTRIES):
+        self.namespace = namespace
+        self.key = f"{SEMANTIC_MODEL_NAME}:{key}"
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._results = None
+        self._matrix = None  # Row buffer with spare capacity; rows past len(self._results) are unused
+        self._dirty = False
+
+    @classmethod
+    def _get_model(cls):
+        with cls._model_lock:
+            if cls._model is None and SentenceTransformer is not None:
+                try:
+                    cls._model = SentenceTransformer(SEMANTIC_MODEL_NAME)
+                except Exception:
+                    cls._model = False  # Don't retry a model that failed to load
+            return cls._model or None
+
+    def _load(self):
+        if self._results is not None:
+            return
+        self._results = []
+        try:
+            matrix = np.load(_cache_path(self.namespace, self.key, '.npy'))
+            with open(_cache_path(self.namespace, self.key), 'r', encoding='utf-8') as f:
+                results = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Both files are replaced together; a mismatch means a torn or foreign entry
+        if matrix.ndim == 2 and len(matrix) == len(results):
+            self._matrix = matrix.astype(np.float32, copy=False)
+            self._results = results
+
+    def _embed(self, text):
+        model = self._get_model()
+        if model is None:
+            return None
+        try:
+            return model.encode(text, normalize_embeddings=True).astype(np.float32)
+        except Exception:
+            # An embedding failure only costs a cache miss, never the file
+            return None
+
+    def lookup(self, text):
+        """Return the result stored for the most similar earlier text, or None."""
+        with self._lock:
+            embedding = self._embed(text)
+            if embedding is None:
+                return None
+            self._load()
+            if not self._results:
+                return None
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            sims = self._matrix[:len(self._results)] @ embedding
+            best = int(sims.argmax())
+            if sims[best] > self.threshold:
+                return self._results[best]
+            return None
+
+    def add(self, text, result):
+        """Remember result for text in memory; save() persists it."""
+        with self._lock:
+            embedding = self._embed(text)
+            if embedding is None:
+                return
+            self._load()
+            size = len(self._results)
+            if self._matrix is None or size == len(self._matrix):
+                # Grow geometrically so appends copy the matrix O(log N) times, not once per add
+                grown = np.empty((max(16, 2 * size), embedding.shape[0]), dtype=np.float32)
+                if size:
+                    grown[:size] = self._matrix[:size]
+                self._matrix = grown
+            self._matrix[size] = embedding
+            self._results.append(result)
+            self._dirty = True
+
+    def save(self):
+        """Persist the newest max_entries entries if anything was added since loading."""
+        with self._lock:
+            if not self._dirty:
+                return
+            start = max(0, len(self._results) - self.max_entries)
+            matrix = self._matrix[start:len(self._results)]
+            results = self._results[start:]
+            try:
+                _atomic_write(_cache_path(self.namespace, self.key, '.npy'), lambda f: np.save(f, matrix), mode='wb')
+                _atomic_write(_cache_path(self.namespace, self.key), lambda f: json.dump(results, f))
+            except OSError:
+                pass  # Best effort, like cache_set
+            self._dirty = False
@@ -1,19 +1,21 @@
 import os
-import datetime  # Import datetime for date operations
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from rich.progress import Progress, TextColumn, BarColumn, TimeElapsedColumn
-from image_data_processing import get_date_from_exif, extract_date_from_filename # Import date extraction functions
-from file_utils import sanitize_filename # Import sanitize_filename from file_utils
+from file_utils import IMAGE_EXTS
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
 
 def process_files_by_date(file_paths, output_path, dry_run=False, silent=False, log_file=None):
     """Process files to organize them by date."""
     operations = []
     for file_path in file_paths:
-        # Get the modification time
-        mod_time = os.path.getmtime(file_path)
-        # Convert to datetime
-        mod_datetime = datetime.datetime.fromtimestamp(mod_time)
-        year = mod_datetime.strftime('%Y')
-        month = mod_datetime.strftime('%B')  # e.g., 'January', or use '%m' for month number
+        # Get the modification time as local time components (no strftime/locale lookup)
+        mod_time = time.localtime(os.stat(file_path).st_mtime)
+        year = str(mod_time.tm_year)
+        month = MONTHS[mod_time.tm_mon - 1]  # e.g., 'January'
         # Create directory path
         dir_path = os.path.join(output_path, year, month)
         # Prepare new file path
@@ -30,50 +32,35 @@ def process_files_by_date(file_paths, output_path, dry_run=False, silent=False,
         operations.append(operation)
     return operations
 
+# Text-based extensions in type mode, grouped by subfolder
+PLAIN_TEXT_EXTS = frozenset({'.txt', '.md'})
+DOC_EXTS = frozenset({'.doc', '.docx'})
+PDF_EXTS = frozenset({'.pdf'})
+XLS_EXTS = frozenset({'.xls', '.xlsx'})
+EBOOK_EXTS = frozenset({'.epub', '.mobi', '.azw', '.azw3'})
+
+# Destination folder for each extension in type mode; anything else goes to 'others'
+TYPE_FOLDERS = {
+    **dict.fromkeys(IMAGE_EXTS, 'image_files'),
+    **dict.fromkeys(PLAIN_TEXT_EXTS, os.path.join('text_files', 'plain_text_files')),
+    **dict.fromkeys(DOC_EXTS, os.path.join('text_files', 'doc_files')),
+    **dict.fromkeys(PDF_EXTS, os.path.join('text_files', 'pdf_files')),
+    **dict.fromkeys(XLS_EXTS, os.path.join('text_files', 'xls_files')),
+    **dict.fromkeys(EBOOK_EXTS, os.path.join('text_files', 'ebooks')),
+}
+
 def process_files_by_type(file_paths, output_path, dry_run=False, silent=False, log_file=None):
     """Process files to organize them by type, first separating into text-based and image-based files."""
     operations = []
 
-    # Define extensions
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
-    text_extensions = ('.txt', '.md', '.docx', '.doc', '.pdf', '.xls', '.xlsx', '.epub', '.mobi', '.azw', '.azw3')
-
     for file_path in file_paths:
         # Exclude hidden files (additional safety)
         if os.path.basename(file_path).startswith('.'):
             continue
 
-        # Get the file extension
+        # Look up the destination folder from the file extension
         ext = os.path.splitext(file_path)[1].lower()
-
-        # Check if it's an image file
-        if ext in image_extensions:
-            # Image-based files
-            top_folder = 'image_files'
-            # You can add subcategories here if needed
-            folder_name = top_folder
-
-        elif ext in text_extensions:
-            # Text-based files
-            top_folder = 'text_files'
-            # Map extensions to subfolders
-            if ext in ('.txt', '.md'):
-                sub_folder = 'plain_text_files'
-            elif ext in ('.doc', '.docx'):
-                sub_folder = 'doc_files'
-            elif ext == '.pdf':
-                sub_folder = 'pdf_files'
-            elif ext in ('.xls', '.xlsx'):
-                sub_folder = 'xls_files'
-            elif ext in ('.epub', '.mobi', '.azw', '.azw3'):
-                sub_folder = 'ebooks'
-            else:
-                sub_folder = 'others'
-            folder_name = os.path.join(top_folder, sub_folder)
-
-        else:
-            # Other types
-            folder_name = 'others'
+        folder_name = TYPE_FOLDERS.get(ext, 'others')
 
         # Create directory path
         dir_path = os.path.join(output_path, folder_name)
@@ -92,10 +79,34 @@ def process_files_by_type(file_paths, output_path, dry_run=False, silent=False,
 
     return operations
 
+def _get_date_prefix(file_path):
+    """Return the EXIF date of a file, else the date in its filename, else None."""
+    # Imported here so date and type modes don't load PIL and NLTK
+    from image_data_processing import get_date_from_exif, extract_date_from_filename
+    exif_date = get_date_from_exif(file_path)
+    if exif_date:
+        return exif_date
+    date_from_filename = extract_date_from_filename(os.path.basename(file_path))
+    if date_from_filename != "null":
+        return date_from_filename
+    return None
+
 def compute_operations(data_list, new_path, renamed_files, processed_files, prefix_dates=False):
     """Compute the file operations based on generated metadata."""
     operations = []
-    for data in data_list:
+    # Last numeric suffix handed out per (directory, base name, extension)
+    suffix_counts = collections.defaultdict(int)
+
+    # Apply date prefixing if enabled (logic moved from execute_operations)
+    # This ensures the simulated tree also reflects the date prefix.
+    # EXIF reads open every file, so they only run when requested, and in parallel.
+    if prefix_dates:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            date_prefixes = list(executor.map(_get_date_prefix, [data['file_path'] for data in data_list]))
+    else:
+        date_prefixes = [None] * len(data_list)
+
+    for data, date_prefix in zip(data_list, date_prefixes):
         file_path = data['file_path']
         if file_path in processed_files:
             continue
@@ -106,19 +117,7 @@ def compute_operations(data_list, new_path, renamed_files, processed_files, pref
         base_filename = data['filename']
         file_extension = os.path.splitext(file_path)[1]
 
-        # Apply date prefixing if enabled (logic moved from execute_operations)
-        # This ensures the simulated tree also reflects the date prefix
-        date_prefix = None
-        exif_date = get_date_from_exif(file_path)
-        if exif_date:
-            date_prefix = exif_date
-        else:
-            filename_only = os.path.basename(file_path)
-            date_from_filename = extract_date_from_filename(filename_only)
-            if date_from_filename != "null":
-                date_prefix = date_from_filename
-
-        if prefix_dates and date_prefix:
+        if date_prefix:
             new_file_name = f"{date_prefix}_{base_filename}{file_extension}"
         else:
             new_file_name = f"{base_filename}{file_extension}"
@@ -127,12 +126,15 @@ def compute_operations(data_list, new_path, renamed_files, processed_files, pref
         dir_path = os.path.join(new_path, folder_name)
         new_file_path = os.path.join(dir_path, new_file_name)
 
-        # Handle duplicates
-        counter = 1
-        while new_file_path in renamed_files:
-            new_file_name = f"{data['filename']}_{counter}" + os.path.splitext(file_path)[1]
-            new_file_path = os.path.join(dir_path, new_file_name)
-            counter += 1
+        # Handle duplicates; resume from the last suffix used for this name
+        if new_file_path in renamed_files:
+            key = (dir_path, base_filename, file_extension)
+            counter = suffix_counts[key]
+            while new_file_path in renamed_files:
+                counter += 1
+                new_file_name = f"{base_filename}_{counter}{file_extension}"
+                new_file_path = os.path.join(dir_path, new_file_name)
+            suffix_counts[key] = counter
 
         # Decide whether to use hardlink or symlink
         link_type = 'hardlink'  # Assume hardlink for now
@@ -151,10 +153,38 @@ def compute_operations(data_list, new_path, renamed_files, processed_files, pref
 
     return operations  # Return the list of operations for display or further processing
 
+def _operation_destination(operation):
+    """Return the path an operation links to."""
+    # The new_file_name already includes the date prefix if applicable
+    new_file_name = operation.get('new_file_name', operation['destination'])
+    return os.path.join(os.path.dirname(operation['destination']), os.path.basename(new_file_name))
+
+def _perform_operation(operation, dry_run=False):
+    """Create the link for one operation and return the message describing the result."""
+    source = operation['source']
+    link_type = operation['link_type']
+    destination = _operation_destination(operation)
+
+    if dry_run:
+        return f"Dry run: would create {link_type} from '{source}' to '{destination}'"
+    try:
+        if link_type == 'hardlink':
+            os.link(source, destination)
+        else:
+            os.symlink(source, destination)
+        return f"Created {link_type} from '{source}' to '{destination}'"
+    except Exception as e:
+        return f"Error creating {link_type} from '{source}' to '{destination}': {e}"
+
 def execute_operations(operations, dry_run=False, silent=False, log_file=None, prefix_dates=False):
     """Execute the file operations."""
     total_operations = len(operations)
 
+    if not dry_run:
+        # Create every destination directory once, before linking
+        for dir_path in {os.path.dirname(operation['destination']) for operation in operations}:
+            os.makedirs(dir_path, exist_ok=True)
+
     with Progress(
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
@@ -162,37 +192,32 @@ def execute_operations(operations, dry_run=False, silent=False, log_file=None, p
         transient=True
     ) as progress:
         task = progress.add_task("Organizing Files...", total=total_operations)
-        for operation in operations:
-            source = operation['source']
-            destination = operation['destination']
-            link_type = operation['link_type']
-            dir_path = os.path.dirname(destination)
-
-            # The new_file_name already includes the date prefix if applicable
-            new_file_name = operation['new_file_name']
-            destination = os.path.join(dir_path, os.path.basename(new_file_name))
-
-            if dry_run:
-                message = f"Dry run: would create {link_type} from '{source}' to '{destination}'"
-            else:
-                # Ensure the directory exists before performing the operation
-                os.makedirs(dir_path, exist_ok=True)
-
-                try:
-                    if link_type == 'hardlink':
-                        os.link(source, destination)
-                    else:
-                        os.symlink(source, destination)
-                    message = f"Created {link_type} from '{source}' to '{destination}'"
-                except Exception as e:
-                    message = f"Error creating {link_type} from '{source}' to '{destination}': {e}"
-
-            progress.advance(task)
-
-            # Silent mode handling
-            if silent:
-                if log_file:
-                    with open(log_file, 'a') as f:
-                        f.write(message + '\n')
-            else:
-                print(message)
\ No newline at end of file
+        # Date and type modes can map several files to one destination. Each
+        # destination's operations run in order on one worker, so the first
+        # operation wins as it did when linking sequentially
+        groups = collections.defaultdict(list)
+        for index, operation in enumerate(operations):
+            groups[_operation_destination(operation)].append((index, operation))
+
+        def perform_group(group):
+            return [(index, _perform_operation(operation, dry_run)) for index, operation in group]
+
+        messages = [None] * total_operations
+        # Linking is a blocking metadata syscall that releases the GIL
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = [executor.submit(perform_group, group) for group in groups.values()]
+            for future in as_completed(futures):
+                group_messages = future.result()
+                for index, message in group_messages:
+                    messages[index] = message
+                progress.advance(task, len(group_messages))
+
+    if not messages:
+        return
+    # Silent mode handling; messages are written in one shot, in operation order
+    if silent:
+        if log_file:
+            # log_file is the handle main() opened once for the whole run
+            log_file.write('\n'.join(messages) + '\n')
+    else:
+        print('\n'.join(messages))
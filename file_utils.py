@@ -1,15 +1,33 @@
 import os
 import re # Import re for sanitize_filename
+import sys
+import csv
+import itertools
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
-import fitz  # PyMuPDF
-import docx
-import pandas as pd  # Import pandas to read Excel and CSV files
-from pptx import Presentation  # Import Presentation for PPT files
-from ollama_inference import OllamaTextInference, OllamaVLMInference
+# Document libraries (PyMuPDF, python-docx, openpyxl, pandas, python-pptx) and
+# the Ollama client are imported inside their readers so date and type modes
+# never pay for them
 
-# Instantiate Ollama inference classes
-ollama_text_inference = OllamaTextInference()
-ollama_vlm_inference = OllamaVLMInference()
+# Extensions handled in content mode
+IMAGE_EXTS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'})
+TEXT_EXTS = frozenset({'.txt', '.docx', '.doc', '.pdf', '.md', '.xls', '.xlsx', '.ppt', '.pptx', '.csv'})
+AUDIO_EXTS = frozenset({'.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'}) # Common audio extensions
+
+@functools.lru_cache(maxsize=None)
+def _get_pdf_vlm_inference():
+    """Return the vision model used for images embedded in PDFs, created on first use."""
+    from ollama_inference import OllamaVLMInference
+    return OllamaVLMInference()
+
+# Concurrent vision requests when interpreting images embedded in PDFs
+PDF_VISION_WORKERS = 4
+
+@functools.lru_cache(maxsize=None)
+def _get_pdf_vision_executor(max_workers):
+    """Return the pool shared by every PDF read, so concurrent reads stay within max_workers vision requests."""
+    return ThreadPoolExecutor(max_workers=max_workers)
 
 def read_text_file(file_path):
     """Read text content from a text file."""
@@ -23,8 +41,9 @@ def read_text_file(file_path):
         return None
 
 def read_docx_file(file_path):
-    """Read text content from a .docx or .doc file."""
+    """Read text content from a .docx file."""
     try:
+        import docx
         doc = docx.Document(file_path)
         full_text = [para.text for para in doc.paragraphs]
         return '\n'.join(full_text)
@@ -32,13 +51,14 @@ def read_docx_file(file_path):
         print(f"Error reading DOCX file {file_path}: {e}")
         return None
 
-def read_pdf_file(file_path):
+def read_pdf_file(file_path, vision_workers=PDF_VISION_WORKERS):
     """Read text content and visually interpret images from a PDF file."""
     extracted_text = []
     visual_interpretations = []
-    temp_image_folder = "temp_pdf_images"
 
     try:
+        import fitz  # PyMuPDF
+        # Open the document once and share it with the image extraction below
         doc = fitz.open(file_path)
         num_pages_to_read = 3
 
@@ -46,12 +66,15 @@ def read_pdf_file(file_path):
             page = doc.load_page(page_num)
             extracted_text.append(page.get_text())
 
-        # Extract images and get visual interpretations
-        image_paths = extract_images_from_pdf(file_path, temp_image_folder)
-        for img_path in image_paths:
-            prompt = "Describe this image in detail, focusing on any text or important visual information."
-            interpretation = ollama_vlm_inference.generate_vision(prompt, img_path)
-            visual_interpretations.append(f"Image {os.path.basename(img_path)}: {interpretation}")
+        # Extract images in memory and get visual interpretations; the VLM
+        # calls are network-bound, so issue them concurrently
+        images = list(extract_images_from_pdf(doc))
+        prompt = "Describe this image in detail, focusing on any text or important visual information."
+        ollama_vlm_inference = _get_pdf_vlm_inference()
+        executor = _get_pdf_vision_executor(vision_workers)
+        interpretations = executor.map(lambda image: ollama_vlm_inference.generate_vision_bytes(prompt, image[1]), images)
+        for (image_name, _, _), interpretation in zip(images, interpretations):
+            visual_interpretations.append(f"Image {image_name}: {interpretation}")
 
         # Combine results
         combined_content = "extracted text:\n" + "\n".join(extracted_text)
@@ -63,47 +86,43 @@ def read_pdf_file(file_path):
     except Exception as e:
         print(f"Error processing PDF file {file_path}: {e}")
         return None
-    finally:
-        # Clean up temporary image files and folder
-        if os.path.exists(temp_image_folder):
-            for file_name in os.listdir(temp_image_folder):
-                file_path = os.path.join(temp_image_folder, file_name)
-                try:
-                    if os.path.isfile(file_path) or os.path.islink(file_path):
-                        os.unlink(file_path)
-                except Exception as e:
-                    print(f"Error removing file {file_path}: {e}")
-            try:
-                os.rmdir(temp_image_folder)
-            except Exception as e:
-                print(f"Error removing directory {temp_image_folder}: {e}")
-
-def extract_images_from_pdf(pdf_path, output_folder="temp_images"):
-    """Extract images from a PDF and save them to a temporary folder."""
-    os.makedirs(output_folder, exist_ok=True)
-    doc = fitz.open(pdf_path)
-    image_paths = []
+
+def extract_images_from_pdf(pdf):
+    """Yield (name, image_bytes, ext) for each image embedded in a PDF (path or open document)."""
+    import fitz  # PyMuPDF
+    # PyMuPDF documents are not thread-safe, so extraction stays sequential
+    doc = fitz.open(pdf) if isinstance(pdf, str) else pdf
     for i in range(len(doc)):
         for img in doc.get_page_images(i):
             xref = img[0]
             base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
             image_ext = base_image["ext"]
-            image_filename = os.path.join(output_folder, f"page{i+1}-img{xref}.{image_ext}")
-            with open(image_filename, "wb") as f:
-                f.write(image_bytes)
-            image_paths.append(image_filename)
-    return image_paths
+            yield f"page{i+1}-img{xref}.{image_ext}", base_image["image"], image_ext
+
+def _rows_to_text(rows):
+    return '\n'.join('\t'.join('' if cell is None else str(cell) for cell in row) for row in rows)
 
 def read_spreadsheet_file(file_path):
     """Read text content from an Excel or CSV file."""
+    max_rows = 200  # Limit processing time, like read_text_file's character cap
     try:
-        if file_path.lower().endswith('.csv'):
-            df = pd.read_csv(file_path)
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.csv':
+            with open(file_path, 'r', newline='', encoding='utf-8', errors='ignore') as file:
+                return _rows_to_text(itertools.islice(csv.reader(file), max_rows))
+        elif ext == '.xlsx':
+            import openpyxl
+            # Stream rows instead of loading the whole workbook
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                return _rows_to_text(itertools.islice(workbook.active.iter_rows(values_only=True), max_rows))
+            finally:
+                workbook.close()
         else:
-            df = pd.read_excel(file_path)
-        text = df.to_string()
-        return text
+            # Legacy .xls files are only readable through pandas/xlrd
+            import pandas as pd
+            df = pd.read_excel(file_path, nrows=max_rows)
+            return df.to_string()
     except Exception as e:
         print(f"Error reading spreadsheet file {file_path}: {e}")
         return None
@@ -111,6 +130,7 @@ def read_spreadsheet_file(file_path):
 def read_ppt_file(file_path):
     """Read text content from a PowerPoint file."""
     try:
+        from pptx import Presentation
         prs = Presentation(file_path)
         full_text = []
         for slide in prs.slides:
@@ -122,62 +142,120 @@ def read_ppt_file(file_path):
         print(f"Error reading PowerPoint file {file_path}: {e}")
         return None
 
-def read_file_data(file_path):
-    """Read content from a file based on its extension."""
-    ext = os.path.splitext(file_path.lower())[1]
-    if ext in ['.txt', '.md']:
-        return read_text_file(file_path)
-    elif ext in ['.docx', '.doc']:
-        return read_docx_file(file_path)
-    elif ext == '.pdf':
-        return read_pdf_file(file_path)
-    elif ext in ['.xls', '.xlsx', '.csv']:
-        return read_spreadsheet_file(file_path)
-    elif ext in ['.ppt', '.pptx']:
-        return read_ppt_file(file_path)
-    else:
+# Map each supported extension to the reader that extracts its text content
+FILE_READERS = {
+    '.txt': read_text_file,
+    '.md': read_text_file,
+    '.docx': read_docx_file,
+    '.pdf': read_pdf_file,
+    '.xls': read_spreadsheet_file,
+    '.xlsx': read_spreadsheet_file,
+    '.csv': read_spreadsheet_file,
+    '.pptx': read_ppt_file,
+}
+# Legacy binary .doc and .ppt files are not zip packages, so python-docx and
+# python-pptx can't open them; they are rejected by extension without a read
+SUPPORTED_TEXT_EXTS = frozenset(FILE_READERS)
+
+def read_file_data(file_path, vision_workers=PDF_VISION_WORKERS):
+    """Read content from a file based on its extension.
+
+    vision_workers caps the vision requests for images in PDFs, across all
+    threads reading with the same value.
+    """
+    reader = FILE_READERS.get(os.path.splitext(file_path)[1].lower())
+    if reader is None:
         return None  # Unsupported file type
+    if reader is read_pdf_file:
+        return reader(file_path, vision_workers=vision_workers)
+    return reader(file_path)
+
+def _tree_entries(dir_path):
+    """Return an iterator of (entry, is_last) for the visible entries of dir_path, sorted by name."""
+    with os.scandir(dir_path) as it:
+        entries = sorted((e for e in it if not e.name.startswith('.')), key=lambda e: e.name)
+    return iter([(entry, i == len(entries) - 1) for i, entry in enumerate(entries)])
+
+def _dir_identity(dir_path):
+    """Return (st_dev, st_ino) of the directory dir_path resolves to, or None if it can't be read."""
+    try:
+        st = os.stat(dir_path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
 
 def display_directory_tree(path):
     """Display the directory tree in a format similar to the 'tree' command, including the full path."""
-    def tree(dir_path, prefix=''):
-        contents = sorted([c for c in os.listdir(dir_path) if not c.startswith('.')])
-        pointers = ['├── '] * (len(contents) - 1) + ['└── '] if contents else []
-        for pointer, name in zip(pointers, contents):
-            full_path = os.path.join(dir_path, name)
-            print(prefix + pointer + name)
-            if os.path.isdir(full_path):
-                extension = '│   ' if pointer == '├── ' else '    '
-                tree(full_path, prefix + extension)
+    lines = [os.path.abspath(path)]
     if os.path.isdir(path):
-        print(os.path.abspath(path))
-        tree(path)
-    else:
-        print(os.path.abspath(path))
+        # Explicit stack of (entries, prefix, directory identity) instead of recursion
+        stack = [(_tree_entries(path), '', _dir_identity(path))]
+        while stack:
+            entries, prefix, _ = stack[-1]
+            item = next(entries, None)
+            if item is None:
+                stack.pop()
+                continue
+            entry, is_last = item
+            lines.append(prefix + ('└── ' if is_last else '├── ') + entry.name)
+            # Symlinked directories are expanded like os.path.isdir did, except
+            # one that points back at a directory being listed (a loop)
+            if entry.is_dir():
+                identity = _dir_identity(entry.path)
+                if identity is not None and identity not in {ancestor for _, _, ancestor in stack}:
+                    stack.append((_tree_entries(entry.path), prefix + ('    ' if is_last else '│   '), identity))
+    # One write for the whole tree instead of a print per line
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+def iter_file_paths(base_path):
+    """Lazily yield file paths under base_path, skipping hidden files and directories.
+
+    Like os.walk: unreadable directories are skipped, symlinked files are
+    returned, and symlinked directories are not descended into.
+    """
+    stack = [base_path]
+    while stack:
+        dir_path = stack.pop()
+        # scandir reports the entry type from readdir, so no extra stat per entry
+        try:
+            it = os.scandir(dir_path)
+        except OSError:
+            continue  # Permission denied or vanished, as os.walk ignores it
+        with it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    yield entry.path
+                elif not entry.is_symlink():
+                    stack.append(entry.path)
 
 def collect_file_paths(base_path):
     """Collect all file paths from the base directory or single file, excluding hidden files."""
     if os.path.isfile(base_path):
         return [base_path]
-    else:
-        file_paths = []
-        for root, _, files in os.walk(base_path):
-            for file in files:
-                if not file.startswith('.'):  # Exclude hidden files
-                    file_paths.append(os.path.join(root, file))
-        return file_paths
+    return list(iter_file_paths(base_path))
+
+# Map each extension to the kind of processing it needs in content mode
+EXT_TO_KIND = {
+    **dict.fromkeys(IMAGE_EXTS, 'image'),
+    **dict.fromkeys(TEXT_EXTS, 'text'),
+    **dict.fromkeys(AUDIO_EXTS, 'audio'),
+}
 
 def separate_files_by_type(file_paths):
     """Separate files into images, text, and audio files based on their extensions."""
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
-    text_extensions = ('.txt', '.docx', '.doc', '.pdf', '.md', '.xls', '.xlsx', '.ppt', '.pptx', '.csv')
-    audio_extensions = ('.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a') # Common audio extensions
-
-    image_files = [fp for fp in file_paths if os.path.splitext(fp.lower())[1] in image_extensions]
-    text_files = [fp for fp in file_paths if os.path.splitext(fp.lower())[1] in text_extensions]
-    audio_files = [fp for fp in file_paths if os.path.splitext(fp.lower())[1] in audio_extensions]
-    return image_files, text_files, audio_files
+    buckets = {'image': [], 'text': [], 'audio': [], 'other': []}
+    for fp in file_paths:
+        # Compute the extension once per path and dispatch through the lookup table
+        buckets[EXT_TO_KIND.get(os.path.splitext(fp)[1].lower(), 'other')].append(fp)
+    return buckets['image'], buckets['text'], buckets['audio']
 
+@functools.lru_cache(maxsize=4096)
 def sanitize_filename(name, max_length=50, max_words=5):
     """Sanitize the filename by removing unwanted words and characters."""
     # Remove file extension if present
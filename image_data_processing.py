@@ -1,38 +1,146 @@
 import re
 import json
 import os
+import hashlib
+import queue
 import time
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from PIL import Image, ExifTags # Import Image and ExifTags
-from nltk.tokenize import word_tokenize
+from PIL import Image # Import Image for EXIF reading
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from rich.progress import Progress, TextColumn, BarColumn, TimeElapsedColumn
 from file_utils import sanitize_filename  # Import sanitize_filename
+from cache_utils import file_fingerprint, cache_get, cache_set
 
 
 
-def process_single_image(image_path, image_inference, text_inference, silent=False, log_file=None):
-    """Process a single image file to generate metadata."""
-    start_time = time.time()
+# Patterns used on every image, compiled once
+_RE_EXT = re.compile(r'\.\w{1,4}$')
+_RE_NONWORD = re.compile(r'[^\w\s]')
+_RE_DIGITS = re.compile(r'\d+')
+_RE_CAMEL = re.compile(r'([a-z])([A-Z])')
+_RE_ANY_DATE = re.compile(r'(?P<sep>(\d{4})[-_.](\d{2})[-_.](\d{2}))|(?P<cmp>(\d{4})(\d{2})(\d{2}))')
+_RE_ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_RE_YEAR_HINT = re.compile(r'(?<!\d)\d{4}(?!\d)')
+# Runs of letters (Unicode-aware, like str.isalpha); replaces nltk's word_tokenize
+_RE_ALPHA = re.compile(r'[^\W\d_]+')
+
+# Numeric EXIF tag ids, looked up directly instead of scanning every tag
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+# Images whose descriptions are requested together from the vision model
+IMAGE_BATCH_SIZE = 8
+# Concurrent Ollama requests; a single-GPU server mostly serializes them, so keep it small
+DEFAULT_CONCURRENCY = 4
+
+# The description only feeds 2-3 filename nouns, so ask for one short sentence
+# and hard-cap decoding; generation time grows with output length
+DESCRIPTION_PROMPT = "In one sentence (max 20 words), name the main subject and 2-3 salient objects."
+DESCRIPTION_OPTIONS = {"num_predict": 60}
+
+# Instructions and examples come first and never change, so Ollama can reuse
+# the KV cache of this prefix; only the description and date are prefilled per image.
+NAMING_PROMPT_PREFIX = """Based on the description at the end, the EXIF date (if any), and the date extracted from the filename (if any), generate a suitable folder name (max 2 words, nouns only) and a descriptive filename (max 3 words, nouns only, underscores for spaces). Consider incorporating the most relevant date into the filename if appropriate.
+
+Example:
+Description: A photo of a sunset over the mountains.
+EXIF Date: null
+Date from Filename: null
+JSON Output: { "foldername": "landscapes", "filename": "sunset_over_mountains" }
 
-    # Create a Progress instance for this file
-    with Progress(
+Example:
+Description: A photo of a birthday party.
+EXIF Date: 2023-01-15
+Date from Filename: null
+JSON Output: { "foldername": "events", "filename": "2023-01-15 birthday_party" }
+
+Example:
+Description: A photo of a document scanned.
+EXIF Date: null
+Date from Filename: 2024-03-10
+JSON Output: { "foldername": "documents", "filename": "2024-03-10 scanned_document" }
+
+Generate ONLY the JSON output, nothing else. Do not include any conversational text.
+"""
+
+def _description_cache_key(image_path, image_inference):
+    """Key a cached description by image contents, vision model, prompt and options."""
+    prompt_hash = hashlib.md5((DESCRIPTION_PROMPT + json.dumps(DESCRIPTION_OPTIONS, sort_keys=True)).encode('utf-8')).hexdigest()
+    return f"{file_fingerprint(image_path)}:{image_inference.model_name}:{prompt_hash}"
+
+def describe_images(image_paths, image_inference, max_workers=None):
+    """Describe images with the vision model, serving repeats from the on-disk cache.
+
+    Only cache misses are sent to the model, as one batch; results keep input order.
+    """
+    keys = []
+    for image_path in image_paths:
+        try:
+            keys.append(_description_cache_key(image_path, image_inference))
+        except OSError:
+            keys.append(None)
+    descriptions = [cache_get('vlm', key) if key else None for key in keys]
+    misses = [i for i, description in enumerate(descriptions) if description is None]
+    if misses:
+        fresh = image_inference.generate_vision_batch(
+            DESCRIPTION_PROMPT, [image_paths[i] for i in misses], max_workers=max_workers, options=DESCRIPTION_OPTIONS
+        )
+        for i, description in zip(misses, fresh):
+            descriptions[i] = description
+            if keys[i]:
+                cache_set('vlm', keys[i], description)
+    return descriptions
+
+_log_lock = threading.Lock()
+
+def _new_progress():
+    return Progress(
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
         TimeElapsedColumn()
-    ) as progress:
-        task_id = progress.add_task(f"Processing {os.path.basename(image_path)}", total=1.0)
-        foldername, filename, description = generate_image_metadata(image_path, progress, task_id, image_inference, text_inference)
-    
+    )
+
+# JSON schemas passed to Ollama's structured output for the text-model calls
+NAMING_SCHEMA = {
+    "type": "object",
+    "properties": {"foldername": {"type": "string"}, "filename": {"type": "string"}},
+    "required": ["foldername", "filename"]
+}
+DATE_SCHEMA = {
+    "type": "object",
+    "properties": {"date": {"type": "string"}},
+    "required": ["date"]
+}
+
+# Default for exif_date meaning "not prefetched"; None already means "no EXIF date"
+_EXIF_UNREAD = object()
+
+def process_single_image(image_path, image_inference, text_inference, progress, task_id, silent=False, log_file=None, description=None, exif_date=_EXIF_UNREAD):
+    """Process a single image file to generate metadata.
+
+    progress and task_id belong to the Progress shared by the whole batch;
+    rich allows only one live display at a time. A description already
+    produced by a batched vision call can be passed in to skip the
+    per-image vision request, and a prefetched EXIF date to skip the read.
+    """
+    start_time = time.time()
+
+    foldername, filename, description = generate_image_metadata(image_path, progress, task_id, image_inference, text_inference, description=description, exif_date=exif_date)
+
     end_time = time.time()
     time_taken = end_time - start_time
 
     message = f"File: {image_path}\nTime taken: {time_taken:.2f} seconds\nDescription: {description}\nFolder name: {foldername}\nGenerated filename: {filename}\n"
     if silent:
         if log_file:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+            # log_file is the handle main() opened once; the lock keeps worker messages whole
+            with _log_lock:
+                log_file.write(message + '\n')
     else:
         print(message)
     return {
@@ -42,174 +150,198 @@ def process_single_image(image_path, image_inference, text_inference, silent=Fal
         'description': description
     }
 
-def process_image_files(image_paths, image_inference, text_inference, silent=False, log_file=None):
-    """Process image files sequentially."""
-    data_list = []
-    for image_path in image_paths:
-        data = process_single_image(image_path, image_inference, text_inference, silent=silent, log_file=log_file)
-        data_list.append(data)
+def process_image_files(image_paths, image_inference, text_inference, silent=False, log_file=None, batch_size=IMAGE_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    """Process image files as a two-stage pipeline.
+
+    A vision thread describes the images batch by batch while up to
+    `concurrency` text workers generate names for descriptions already
+    available, so the vision and text models are busy at the same time.
+    EXIF dates are read up front on a separate pool, overlapping that I/O
+    with the first vision requests.
+    """
+    # At least one worker, or nothing would drain the work
+    concurrency = max(1, concurrency)
+    data_list = [None] * len(image_paths)
+    errors = []
+    described = queue.Queue(maxsize=2 * batch_size)
+
+    with _new_progress() as progress:
+        def vision_worker():
+            try:
+                for start in range(0, len(image_paths), batch_size):
+                    batch = image_paths[start:start + batch_size]
+                    for offset, description in enumerate(describe_images(batch, image_inference, max_workers=concurrency)):
+                        described.put((start + offset, description))
+            finally:
+                # One sentinel per text worker so they all stop once the queue drains
+                for _ in range(concurrency):
+                    described.put(None)
+
+        def text_worker():
+            while True:
+                item = described.get()
+                if item is None:
+                    return
+                index, description = item
+                image_path = image_paths[index]
+                task_id = progress.add_task(f"Processing {os.path.basename(image_path)}", total=2)
+                try:
+                    data_list[index] = process_single_image(image_path, image_inference, text_inference, progress, task_id, silent=silent, log_file=log_file, description=description, exif_date=exif_dates[index].result())
+                except Exception as e:
+                    # Keep draining so the vision thread never blocks on a full queue
+                    errors.append(e)
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as exif_executor, \
+                ThreadPoolExecutor(max_workers=concurrency + 1) as executor:
+            exif_dates = [exif_executor.submit(get_date_from_exif, image_path) for image_path in image_paths]
+            futures = [executor.submit(vision_worker)]
+            futures += [executor.submit(text_worker) for _ in range(concurrency)]
+            for future in futures:
+                future.result()
+
+    if errors:
+        raise errors[0]
     return data_list
 
+def _valid_date(year, month, day):
+    """Return YYYY-MM-DD if the parts form a real calendar date in 1900-2100, else None."""
+    try:
+        date = datetime(int(year), int(month), int(day))
+    except ValueError:
+        return None
+    return date.strftime('%Y-%m-%d') if 1900 <= date.year <= 2100 else None
+
 def extract_date_from_filename(filename):
     """
     Extracts a date (YYYY-MM-DD, YYYYMMDD, YYYY_MM_DD) from a filename.
     Returns the date string if found, otherwise "null".
     """
-    # Regex for YYYY-MM-DD or YYYY_MM_DD
-    match = re.search(r'(\d{4}[-_\.]\d{2}[-_\.]\d{2})', filename)
-    if match:
-        date_str = match.group(1)
-        return date_str.replace('_', '-').replace('.', '-')
-
-    # Regex for YYYYMMDD
-    match = re.search(r'(\d{8})', filename)
-    if match:
-        date_str = match.group(1)
-        # Basic validation for YYYYMMDD to avoid matching random 8 digits
-        try:
-            datetime.strptime(date_str, '%Y%m%d')
-            return f"{date_str[0:4]}-{date_str[4:6]}-{date_str[6:8]}"
-        except ValueError:
-            pass
-    return "null"
+    # One scan for either YYYY-MM-DD / YYYY_MM_DD / YYYY.MM.DD or YYYYMMDD.
+    # The first real separated date wins; the first real compact date is the
+    # fallback, so a random digit run doesn't hide a valid date later in the name
+    compact_date = None
+    for match in _RE_ANY_DATE.finditer(filename):
+        groups = match.groups()
+        if match.group('sep'):
+            date_str = _valid_date(*groups[1:4])
+            if date_str:
+                return date_str
+        elif compact_date is None:
+            compact_date = _valid_date(*groups[5:8])
+    return compact_date or "null"
 
-def generate_image_metadata(image_path, progress, task_id, image_inference, text_inference):
-    """Generate description, folder name, and filename for an image file."""
+# Words that never make a useful file or folder name; NLTK stopwords are added on first use
+_UNWANTED_WORDS = frozenset([
+    'the', 'and', 'based', 'generated', 'this', 'is', 'filename', 'file', 'image', 'picture', 'photo',
+    'folder', 'category', 'output', 'only', 'below', 'text', 'jpg', 'png', 'jpeg', 'gif', 'bmp', 'svg',
+    'logo', 'in', 'on', 'of', 'with', 'by', 'for', 'to', 'from', 'a', 'an', 'as', 'at', 'red', 'blue',
+    'green', 'color', 'colors', 'colored', 'text', 'graphic', 'graphics', 'main', 'subject', 'important',
+    'details', 'description', 'depicts', 'show', 'shows', 'display', 'illustrates', 'presents', 'features',
+    'provides', 'covers', 'includes', 'demonstrates', 'describes'
+])
+_LEMMATIZER = WordNetLemmatizer()
+_nltk_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def _all_unwanted_words():
+    """Return the unwanted words plus NLTK's English stopwords, loaded once per process."""
+    # NLTK corpora load lazily and are not thread-safe on first access; the
+    # data is only available after ensure_nltk_data(), so this can't run at import
+    with _nltk_lock:
+        stop_words = stopwords.words('english')
+        _LEMMATIZER.lemmatize('images')  # Load WordNet while holding the lock
+    return _UNWANTED_WORDS.union(stop_words)
+
+@functools.lru_cache(maxsize=4096)
+def _lemmatize(word):
+    return _LEMMATIZER.lemmatize(word)
 
-    # Total steps in processing an image
-    total_steps = 2 # One for vision inference, one for text inference
+@functools.lru_cache(maxsize=4096)
+def _clean_ai_output(text, max_words):
+    """Clean and process the AI output into at most max_words underscore-joined words."""
+    all_unwanted_words = _all_unwanted_words()
+    # Remove file extensions and special characters
+    text = _RE_EXT.sub('', text)  # Remove file extensions like .jpg, .png
+    text = _RE_NONWORD.sub(' ', text)  # Remove special characters
+    text = _RE_DIGITS.sub('', text)  # Remove digits
+    text = text.strip()
+    # Split concatenated words (e.g., 'GoogleChrome' -> 'Google Chrome')
+    text = _RE_CAMEL.sub(r'\1 \2', text)
+    # Tokenize and lemmatize words
+    words = [_lemmatize(word) for word in _RE_ALPHA.findall(text.lower())]
+    # Remove unwanted words and duplicates (dict keys keep first-seen order), limit to max words
+    filtered_words = list(dict.fromkeys(w for w in words if w not in all_unwanted_words))[:max_words]
+    return '_'.join(filtered_words)
+
+def generate_image_metadata(image_path, progress, task_id, image_inference, text_inference, description=None, exif_date=_EXIF_UNREAD):
+    """Generate description, folder name, and filename for an image file."""
 
-    # Step 1: Generate description using image_inference
-    description_prompt = "Please provide a detailed description of this image, focusing on the main subject and any important details."
-    description = image_inference.generate_vision(description_prompt, image_path).strip()
-    progress.update(task_id, advance=1 / total_steps)
+    # The task has two steps: one for vision inference, one for text inference
+    # Step 1: Generate description using image_inference, unless it was batched upstream
+    if description is None:
+        description = describe_images([image_path], image_inference)[0]
+    description = description.strip()
+    progress.advance(task_id)
 
     # Step 2: Generate filename and folder name using text_inference based on the description
-    exif_date = get_date_from_exif(image_path)
+    if exif_date is _EXIF_UNREAD:
+        exif_date = get_date_from_exif(image_path)
     filename_only = os.path.basename(image_path)
     date_from_filename = extract_date_from_filename(filename_only)
 
-    # Determine the date to pass to the LLM, prioritizing non-null values.
-    # If both are null, then try LLM extraction from description or filename.
+    # Determine the date to pass to the LLM, prioritizing non-null values:
+    # EXIF first, then the filename regex. The LLM is only asked when both fail
+    # and the filename or description contains a 4-digit number that may be a
+    # year, in a single call over both texts.
     llm_date_for_prompt = "null"
     if exif_date:
         llm_date_for_prompt = exif_date
     elif date_from_filename != "null":
         llm_date_for_prompt = date_from_filename
     else:
-        # Ask LLM to extract date from filename if not found elsewhere
-        date_extraction_prompt = f"""Extract a date in YYYY-MM-DD format from the following text. If no date is found, output 'null'.
-Text: {filename_only}
-Date:"""
-        llm_extracted_date = text_inference.generate(date_extraction_prompt).strip()
-        if re.match(r'\d{4}-\d{2}-\d{2}', llm_extracted_date):
-            llm_date_for_prompt = llm_extracted_date
-        else:
-            # If still no date, try from description (existing logic, but now part of this flow)
-            date_extraction_prompt = f"""Extract a date in YYYY-MM-DD format from the following text. If no date is found, output 'null'.
-Text: {description}
-Date:"""
-            llm_extracted_date = text_inference.generate(date_extraction_prompt).strip()
-            if re.match(r'\d{4}-\d{2}-\d{2}', llm_extracted_date):
+        date_source_text = f"{filename_only}\n{description}"
+        if _RE_YEAR_HINT.search(date_source_text):
+            date_extraction_prompt = f"""Extract a date in YYYY-MM-DD format from the following text. Return a JSON object with the key 'date'. If no date is found, use 'null'.
+Text: {date_source_text}
+JSON Output:"""
+            try:
+                llm_extracted_date = str(json.loads(text_inference.generate(date_extraction_prompt, format=DATE_SCHEMA)).get("date", "")).strip()
+            except (json.JSONDecodeError, AttributeError):
+                llm_extracted_date = "null"
+            if _RE_ISO_DATE.match(llm_extracted_date):
                 llm_date_for_prompt = llm_extracted_date
-            else:
-                llm_date_for_prompt = "null"
-
-    prompt = f"""Based on the description below, the EXIF date (if any), and the date extracted from the filename (if any), generate a suitable folder name (max 2 words, nouns only) and a descriptive filename (max 3 words, nouns only, underscores for spaces). Consider incorporating the most relevant date into the filename if appropriate.
 
+    prompt = NAMING_PROMPT_PREFIX + f"""
 Description: {description}
 Date for consideration: {llm_date_for_prompt}
 
-Example:
-Description: A photo of a sunset over the mountains.
-EXIF Date: null
-Date from Filename: null
-JSON Output: {{ "foldername": "landscapes", "filename": "sunset_over_mountains" }}
-
-Example:
-Description: A photo of a birthday party.
-EXIF Date: 2023-01-15
-Date from Filename: null
-JSON Output: {{ "foldername": "events", "filename": "2023-01-15 birthday_party" }}
-
-Example:
-Description: A photo of a document scanned.
-EXIF Date: null
-Date from Filename: 2024-03-10
-JSON Output: {{ "foldername": "documents", "filename": "2024-03-10 scanned_document" }}
-
-Generate ONLY the JSON output, nothing else. Do not include any conversational text.
-
 JSON Output:"""
-    output = text_inference.generate(prompt).strip()
-    # Use regex to find a JSON object within the output
-    json_match = re.search(r'\{.*?\}', output, re.DOTALL)
-    if not json_match:
-        raise ValueError(f"Could not find JSON in model output: {output}")
-
-    json_string = json_match.group(0)
-
+    # Structured output: Ollama constrains decoding to this schema, so no regex extraction is needed
+    output = text_inference.generate(prompt, format=NAMING_SCHEMA).strip()
     try:
-        response_json = json.loads(json_string)
+        response_json = json.loads(output)
         foldername = sanitize_filename(response_json.get("foldername", ""))
         filename = sanitize_filename(response_json.get("filename", ""))
     except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON from model output: {json_string}. Error: {e}")
-
-    progress.update(task_id, advance=1 / total_steps)
-
-    # Remove any unwanted words and stopwords
-    unwanted_words = set([
-        'the', 'and', 'based', 'generated', 'this', 'is', 'filename', 'file', 'image', 'picture', 'photo',
-        'folder', 'category', 'output', 'only', 'below', 'text', 'jpg', 'png', 'jpeg', 'gif', 'bmp', 'svg',
-        'logo', 'in', 'on', 'of', 'with', 'by', 'for', 'to', 'from', 'a', 'an', 'as', 'at', 'red', 'blue',
-        'green', 'color', 'colors', 'colored', 'text', 'graphic', 'graphics', 'main', 'subject', 'important',
-        'details', 'description', 'depicts', 'show', 'shows', 'display', 'illustrates', 'presents', 'features',
-        'provides', 'covers', 'includes', 'demonstrates', 'describes'
-    ])
-    stop_words = set(stopwords.words('english'))
-    all_unwanted_words = unwanted_words.union(stop_words)
-    lemmatizer = WordNetLemmatizer()
-
-    # Function to clean and process the AI output
-    def clean_ai_output(text, max_words):
-        # Remove file extensions and special characters
-        text = re.sub(r'\.\w{1,4}$', '', text)  # Remove file extensions like .jpg, .png
-        text = re.sub(r'[^\w\s]', ' ', text)  # Remove special characters
-        text = re.sub(r'\d+', '', text)  # Remove digits
-        text = text.strip()
-        # Split concatenated words (e.g., 'GoogleChrome' -> 'Google Chrome')
-        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-        # Tokenize and lemmatize words
-        words = word_tokenize(text)
-        words = [word.lower() for word in words if word.isalpha()]
-        words = [lemmatizer.lemmatize(word) for word in words]
-        # Remove unwanted words and duplicates
-        filtered_words = []
-        seen = set()
-        for word in words:
-            if word not in all_unwanted_words and word not in seen:
-                filtered_words.append(word)
-                seen.add(word)
-        # Limit to max words
-        filtered_words = filtered_words[:max_words]
-        return '_'.join(filtered_words)
+        raise ValueError(f"Failed to parse JSON from model output: {output}. Error: {e}")
+
+    progress.advance(task_id)
 
     # Process filename
-    filename = clean_ai_output(filename, max_words=3)
+    filename = _clean_ai_output(filename, max_words=3)
     if not filename or filename.lower() in ('untitled', ''):
         # Use keywords from the description
-        filename = clean_ai_output(description, max_words=3)
+        filename = _clean_ai_output(description, max_words=3)
     if not filename:
         filename = 'image_' + os.path.splitext(os.path.basename(image_path))[0]
 
     sanitized_filename = sanitize_filename(filename, max_words=3)
 
     # Process foldername
-    foldername = clean_ai_output(foldername, max_words=2)
+    foldername = _clean_ai_output(foldername, max_words=2)
     if not foldername or foldername.lower() in ('untitled', ''):
         # Attempt to extract keywords from the description
-        foldername = clean_ai_output(description, max_words=2)
+        foldername = _clean_ai_output(description, max_words=2)
         if not foldername:
             foldername = 'images'
 
@@ -223,18 +355,15 @@ def get_date_from_exif(image_path):
     Returns date in 'YYYY-MM-DD' format if found, otherwise None.
     """
     try:
-        img = Image.open(image_path)
-        exif_data = img._getexif()
-        if exif_data:
-            for tag, value in exif_data.items():
-                tag_name = ExifTags.TAGS.get(tag, tag)
-                if tag_name == 'DateTimeOriginal':
-                    # EXIF date format is 'YYYY:MM:DD HH:MM:SS'
-                    dt_object = datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-                    return dt_object.strftime('%Y-%m-%d')
-                elif tag_name == 'DateTime':
-                    dt_object = datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-                    return dt_object.strftime('%Y-%m-%d')
+        # getexif() parses only the metadata segment; pixel data is never decoded
+        with Image.open(image_path) as img:
+            exif = img.getexif()
+            # DateTimeOriginal lives in the Exif sub-IFD, DateTime in IFD0
+            value = exif.get_ifd(EXIF_IFD_POINTER).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        if value:
+            # EXIF date format is 'YYYY:MM:DD HH:MM:SS'
+            dt_object = datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
+            return dt_object.strftime('%Y-%m-%d')
     except Exception:
         # print(f"Error reading EXIF data from {image_path}")
         pass
@@ -1,7 +1,10 @@
 import os
 import time
 import argparse
+import functools
+import hashlib
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from modes import Mode
 from rich.console import Console
 
@@ -9,7 +12,8 @@ from file_utils import (
     display_directory_tree,
     collect_file_paths,
     separate_files_by_type,
-    read_file_data
+    read_file_data,
+    SUPPORTED_TEXT_EXTS
 )
 
 from data_processing_common import (
@@ -19,29 +23,28 @@ from data_processing_common import (
     process_files_by_type,
 )
 
-from text_data_processing import (
-    process_text_files
-)
-
-from image_data_processing import (
-    process_image_files
-)
-
-from audio_data_processing import (
-    initialize_whisper_model,
-    process_audio_files
-)
-
+# The content-mode processors (NLTK, PIL, faster-whisper, Ollama) are imported
+# inside the content branch; date and type modes start without them
 
+# NLTK packages the content processors need, with the resource path nltk.data.find() checks
+NLTK_PACKAGES = [
+    ('stopwords', 'corpora/stopwords'),
+    ('wordnet', 'corpora/wordnet'),
+]
 
-from ollama_inference import OllamaTextInference, OllamaVLMInference # Import OllamaTextInference and OllamaVLMInference
-
+@functools.lru_cache(maxsize=None)
 def ensure_nltk_data():
     """Ensure that NLTK data is downloaded efficiently and quietly."""
     import nltk
-    nltk.download('stopwords', quiet=True)
-    nltk.download('punkt', quiet=True)
-    nltk.download('wordnet', quiet=True)
+    for package, resource_path in NLTK_PACKAGES:
+        # Only go to the network when the data isn't installed locally
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            nltk.download(package, quiet=True)
+
+# Text files read concurrently before content analysis starts
+FILE_READ_WORKERS = 8
 
 # Initialize models
 
@@ -52,7 +55,9 @@ audio_inference = None
 def initialize_models(silent_mode=False):
     """Initialize the models if they haven't been initialized yet."""
     global image_inference, text_inference, audio_inference
-    
+    from ollama_inference import OllamaTextInference, OllamaVLMInference
+    from audio_data_processing import initialize_whisper_model
+
     # Initialize Ollama for text inference
     if text_inference is None:
         model_name_text_ollama = "llama3"
@@ -92,19 +97,41 @@ def simulate_directory_tree(operations, base_path):
             current_level = current_level[part]
     return tree
 
+def _sorted_children(tree):
+    """Return an iterator of (name, subtree, is_last) for a simulated tree level, sorted by name."""
+    items = sorted(tree.items())
+    return iter([(name, subtree, i == len(items) - 1) for i, (name, subtree) in enumerate(items)])
+
 def print_simulated_tree(tree, prefix=''):
     """Print the simulated directory tree."""
-    pointers = ['├── '] * (len(tree) - 1) + ['└── '] if tree else []
-    for pointer, key in zip(pointers, tree):
-        print(prefix + pointer + key)
-        if tree[key]:  # If there are subdirectories or files
-            extension = '│   ' if pointer == '├── ' else '    '
-            print_simulated_tree(tree[key], prefix + extension)
+    lines = []
+    # Explicit stack of (children, prefix) instead of recursion, like display_directory_tree
+    stack = [(_sorted_children(tree), prefix)]
+    while stack:
+        children, prefix = stack[-1]
+        item = next(children, None)
+        if item is None:
+            stack.pop()
+            continue
+        name, subtree, is_last = item
+        lines.append(prefix + ('└── ' if is_last else '├── ') + name)
+        if subtree:  # If there are subdirectories or files
+            stack.append((_sorted_children(subtree), prefix + ('    ' if is_last else '│   ')))
+    # One write for the whole tree instead of a print per line
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
 
 
 
 console = Console()
 
+def _positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
 def main():
     parser = argparse.ArgumentParser(description="Organize files based on content, date, or type.")
     input_group = parser.add_mutually_exclusive_group(required=True)
@@ -114,6 +141,7 @@ def main():
     parser.add_argument("--mode", type=str, choices=[mode.name.lower() for mode in Mode], required=True, help="Mode to organize files. Use 'content' for By Content, 'date' for By Date, or 'type' for By Type.")
     parser.add_argument("--prefix_dates", type=str, choices=["yes", "no"], default="no", help="Prefix image files with yyyy-mm-dd if a date is found (yes/no).")
     parser.add_argument("--silent", type=str, choices=["yes", "no"], default="no", help="Enable silent mode (yes/no).")
+    parser.add_argument("--concurrency", type=_positive_int, default=4, help="Number of concurrent Ollama requests when analyzing images, text files and images inside PDFs (default: 4).")
     parser.add_argument("--dry_run", type=str, choices=["yes", "no"], default="yes", help="Perform a dry run without making actual changes (yes/no). Default is 'yes'.")
 
     args = parser.parse_args()
@@ -123,7 +151,9 @@ def main():
     log_file = None
     if silent_mode:
         log_file_path = os.path.join(os.getcwd(), "log.txt")
-        log_file = open(log_file_path, "w")
+        # Opened once for the whole run and line-buffered, so log.txt can be
+        # followed live; every stage writes to this handle
+        log_file = open(log_file_path, "w", buffering=1)
         sys.stdout = log_file
         sys.stderr = log_file
 
@@ -153,9 +183,6 @@ def main():
     console.print(f"Output path successfully set to: {output_dir}")
     console.print("--------------------------------------------------")
 
-    # Ensure NLTK data is downloaded efficiently and quietly
-    ensure_nltk_data()
-
     # Start with dry run set to True
     dry_run = args.dry_run == 'yes'
 
@@ -180,9 +207,15 @@ def main():
     
     if mode == Mode.CONTENT:
         # Proceed with content mode
+        from text_data_processing import process_text_files
+        from image_data_processing import process_image_files
+        from audio_data_processing import process_audio_files
+
         if not silent_mode:
             console.print("Checking if the model is already downloaded. If not, downloading it now.")
         initialize_models()
+        # Ensure NLTK data is downloaded efficiently and quietly
+        ensure_nltk_data()
 
         if not silent_mode:
             console.print("**************************************************")
@@ -192,11 +225,19 @@ def main():
         # Separate files by type
         image_files, text_files, audio_files = separate_files_by_type(file_paths)
 
+        # Read the text files concurrently; reads (and the vision calls for
+        # images inside PDFs) are I/O-bound, so threads overlap them. All
+        # readers share one pool of --concurrency vision requests.
+        # Formats without a reader are skipped without opening the file
+        with ThreadPoolExecutor(max_workers=FILE_READ_WORKERS) as executor:
+            text_contents = list(executor.map(
+                lambda fp: read_file_data(fp, vision_workers=args.concurrency) if os.path.splitext(fp)[1].lower() in SUPPORTED_TEXT_EXTS else None,
+                text_files
+            ))
+
         # Prepare text tuples for processing
         text_tuples = []
-        for fp in text_files:
-            # Use read_file_data to read the file content
-            text_content = read_file_data(fp)
+        for fp, text_content in zip(text_files, text_contents):
             if text_content is None:
                 message = f"Unsupported or unreadable text file format: {fp}"
                 if silent_mode:
@@ -207,9 +248,23 @@ def main():
                 continue  # Skip unsupported or unreadable files
             text_tuples.append((fp, text_content))
 
-        # Process files sequentially
-        data_images = process_image_files(image_files, image_inference, text_inference, silent=silent_mode, log_file=log_file)
-        data_texts = process_text_files(text_tuples, text_inference, silent=silent_mode, log_file=log_file)
+        # Files with identical content (copied PDFs, boilerplate READMEs) get the
+        # same metadata, so only the first file of each group goes to the LLM
+        unique_text_tuples = []
+        unique_index_by_hash = {}
+        text_unique_indexes = []
+        for fp, text_content in text_tuples:
+            digest = hashlib.blake2b(text_content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+            if digest not in unique_index_by_hash:
+                unique_index_by_hash[digest] = len(unique_text_tuples)
+                unique_text_tuples.append((fp, text_content))
+            text_unique_indexes.append(unique_index_by_hash[digest])
+
+        # Process files
+        data_images = process_image_files(image_files, image_inference, text_inference, silent=silent_mode, log_file=log_file, concurrency=args.concurrency)
+        unique_data_texts = process_text_files(unique_text_tuples, text_inference, silent=silent_mode, log_file=log_file, concurrency=args.concurrency)
+        # Give every duplicate its representative's metadata; name clashes get suffixed in compute_operations
+        data_texts = [dict(unique_data_texts[index], file_path=fp) for (fp, _), index in zip(text_tuples, text_unique_indexes)]
 
         # Prepare for copying and renaming
         renamed_files = set()
@@ -234,8 +289,8 @@ def main():
         # Process files by date
         operations = process_files_by_date(file_paths, output_dir, dry_run=dry_run, silent=silent_mode, log_file=log_file)
     elif mode == Mode.TYPE:
-        # Compute operations (renames, moves, etc.)
-        operations = compute_operations(data_images, output_dir, mode, prefix_dates=prefix_dates, silent=silent_mode, log_file=log_file)
+        # Process files by type
+        operations = process_files_by_type(file_paths, output_dir, dry_run=dry_run, silent=silent_mode, log_file=log_file)
     else:
         console.print("Invalid mode selected.")
         return
@@ -264,6 +319,9 @@ def main():
     console.print("The files have been organized successfully.")
     console.print("-" * 50)
 
+    if log_file:
+        log_file.flush()
+
 
 if __name__ == '__main__':
     main()
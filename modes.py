@@ -10,14 +10,18 @@ class Mode(Enum):
 
     @classmethod
     def from_int(cls, value):
-        for mode in cls:
-            if mode.value == value:
-                return mode
-        raise ValueError(f"Invalid mode value: {value}")
+        try:
+            return _BY_INT[value]
+        except (KeyError, TypeError):
+            raise ValueError(f"Invalid mode value: {value}") from None
 
     @classmethod
     def from_string(cls, value):
-        for mode in cls:
-            if mode.name.lower() == value.lower():
-                return mode
-        raise ValueError(f"Invalid mode value: {value}")
+        try:
+            return _BY_STR[value.lower()]
+        except KeyError:
+            raise ValueError(f"Invalid mode value: {value}") from None
+
+# Lookup tables built once so conversions are dict hits, not scans over the members
+_BY_INT = {mode.value: mode for mode in Mode}
+_BY_STR = {mode.name.lower(): mode for mode in Mode}
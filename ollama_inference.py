@@ -1,20 +1,62 @@
 import ollama
-import base64
+try:
+    import pybase64 as base64  # SIMD-accelerated, same b64encode API
+except ImportError:  # Fall back to the standard library
+    import base64
+import pathlib
+import httpx
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Connection pool shared by every inference object; sized for the concurrent
+# vision, naming and PDF workers that can be in flight at once
+CONNECTION_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=16)
+
+@functools.lru_cache(maxsize=None)
+def _get_client(host=None):
+    """Return the process-wide Ollama client for host so all calls share warm keep-alive connections."""
+    # host=None lets the client fall back to OLLAMA_HOST / localhost:11434
+    return ollama.Client(host=host, limits=CONNECTION_LIMITS)
 
 class OllamaTextInference:
-    def __init__(self, model_name="llama3"): # Default to llama3, can be configured
+    def __init__(self, model_name="llama3", keep_alive="1h", host=None): # Default to llama3, can be configured
         self.model_name = model_name
+        # Keep the weights and prompt cache resident between files
+        self.keep_alive = keep_alive
+        self._client = _get_client(host)
 
-    def generate(self, prompt):
-        response = ollama.generate(model=self.model_name, prompt=prompt)
+    def generate(self, prompt, format=None, options=None):
+        # format accepts "json" or a JSON schema to constrain decoding to valid JSON
+        response = self._client.generate(model=self.model_name, prompt=prompt, format=format, options=options, keep_alive=self.keep_alive, stream=False)
         return response['response']
 
+    def generate_batch(self, prompts, max_workers=None, format=None, options=None):
+        # Like generate_vision_batch: concurrent requests the server can
+        # schedule together, one response per prompt, in input order
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers or len(prompts)) as executor:
+            return list(executor.map(lambda prompt: self.generate(prompt, format=format, options=options), prompts))
+
 class OllamaVLMInference:
-    def __init__(self, model_name="llava"): # Default to llava, can be configured
+    def __init__(self, model_name="llava", keep_alive="1h", host=None): # Default to llava, can be configured
         self.model_name = model_name
+        self.keep_alive = keep_alive
+        self._client = _get_client(host)
+
+    def generate_vision(self, prompt, image_path, options=None):
+        return self.generate_vision_bytes(prompt, pathlib.Path(image_path).read_bytes(), options=options)
+
+    def generate_vision_batch(self, prompt, image_paths, max_workers=None, options=None):
+        # Ollama answers one description per request, so a batch is a set of
+        # concurrent requests the server can schedule in parallel; order is kept
+        if not image_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers or len(image_paths)) as executor:
+            return list(executor.map(lambda image_path: self.generate_vision(prompt, image_path, options=options), image_paths))
 
-    def generate_vision(self, prompt, image_path):
-        with open(image_path, 'rb') as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
-        response = ollama.generate(model=self.model_name, prompt=prompt, images=[image_data])
+    def generate_vision_bytes(self, prompt, image_bytes, options=None):
+        # Images already in memory (e.g. extracted from a PDF) skip the disk round-trip
+        image_data = base64.b64encode(image_bytes).decode('utf-8')
+        response = self._client.generate(model=self.model_name, prompt=prompt, images=[image_data], options=options, keep_alive=self.keep_alive, stream=False)
         return response['response']
@@ -2,11 +2,80 @@ import re
 import json
 import os
 import time
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+import functools
+import threading
 from rich.progress import Progress, TextColumn, BarColumn, TimeElapsedColumn
-from data_processing_common import sanitize_filename
+from file_utils import sanitize_filename
+
+# Text files whose metadata prompts are sent to Ollama together
+TEXT_BATCH_SIZE = 8
+# Concurrent Ollama requests within a batch
+DEFAULT_CONCURRENCY = 4
+# Longest document text embedded in the metadata prompt
+MAX_PROMPT_CHARS = 4000
+
+_nltk_lock = threading.Lock()
+
+# Words that never make a useful folder or file name, on top of NLTK's stopwords
+_UNWANTED_WORDS = frozenset([
+    'the', 'and', 'based', 'generated', 'this', 'is', 'filename', 'file', 'document', 'text', 'output', 'only', 'below', 'category',
+    'summary', 'key', 'details', 'information', 'note', 'notes', 'main', 'ideas', 'concepts', 'in', 'on', 'of', 'with', 'by', 'for',
+    'to', 'from', 'a', 'an', 'as', 'at', 'i', 'we', 'you', 'they', 'he', 'she', 'it', 'that', 'which', 'are', 'were', 'was', 'be',
+    'have', 'has', 'had', 'do', 'does', 'did', 'but', 'if', 'or', 'because', 'about', 'into', 'through', 'during', 'before', 'after',
+    'above', 'below', 'any', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so',
+    'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now', 'new', 'depicts', 'show', 'shows', 'display',
+    'illustrates', 'presents', 'features', 'provides', 'covers', 'includes', 'discusses', 'demonstrates', 'describes'
+])
+
+# Patterns compiled once per process
+_RE_PUNCT = re.compile(r'[^\w\s]')
+_RE_DIGIT = re.compile(r'\d+')
+_RE_CAMEL = re.compile(r'([a-z])([A-Z])')
+# Decodes the first JSON object in a reply that has trailing text
+_JSON_DECODER = json.JSONDecoder()
+# Runs of letters; matches what word_tokenize + isalpha() kept, without Punkt
+_RE_WORD = re.compile(r'[^\W\d_]+')
+
+@functools.lru_cache(maxsize=1)
+def _lazy_nltk():
+    """Import NLTK on first use and return (unwanted words incl. stopwords, lemmatizer)."""
+    # NLTK is slow to import and its data is only guaranteed after ensure_nltk_data().
+    # Its corpora load lazily and are not thread-safe on first access, so they
+    # load under a lock in case cleanup is called from several threads
+    with _nltk_lock:
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+        stop_words = stopwords.words('english')
+        lemmatizer = WordNetLemmatizer()
+        lemmatizer.lemmatize('documents')  # Load WordNet while holding the lock
+    return _UNWANTED_WORDS.union(stop_words), lemmatizer
+
+@functools.lru_cache(maxsize=4096)
+def _lemmatize(word):
+    return _lazy_nltk()[1].lemmatize(word)
+
+@functools.lru_cache(maxsize=4096)
+def _clean_ai_output(text, max_words):
+    """Clean and process the AI output into at most max_words underscore-joined words."""
+    all_unwanted_words = _lazy_nltk()[0]
+    # Remove special characters and numbers
+    text = _RE_PUNCT.sub(' ', text)
+    text = _RE_DIGIT.sub('', text)
+    text = text.strip()
+    # Split concatenated words (e.g., 'mathOperations' -> 'math Operations')
+    text = _RE_CAMEL.sub(r'\1 \2', text)
+    # Tokenize and lemmatize words; names are a few words, so a regex split is enough
+    words = [_lemmatize(word) for word in _RE_WORD.findall(text.lower())]
+    # Remove unwanted words and duplicates
+    filtered_words = []
+    seen = set()
+    for word in words:
+        if word not in all_unwanted_words and word not in seen:
+            filtered_words.append(word)
+            seen.add(word)
+    # Limit to max words
+    filtered_words = filtered_words[:max_words]
+    return '_'.join(filtered_words)
 
 def summarize_text_content(text, text_inference):
     """Summarize the given text content."""
@@ -20,19 +89,19 @@ Summary:"""
     summary = text_inference.generate(prompt).strip()
     return summary
 
-def process_single_text_file(args, text_inference, silent=False, log_file=None):
-    """Process a single text file to generate metadata."""
+def process_single_text_file(args, text_inference, progress, task_id, silent=False, log_file=None, output=None, start_time=None):
+    """Process a single text file to generate metadata.
+
+    progress and task_id belong to the Progress shared by the whole batch;
+    rich allows only one live display at a time. A model output already
+    produced by a batched call can be passed in, with the time its batch
+    started.
+    """
     file_path, text = args
-    start_time = time.time()
+    if start_time is None:
+        start_time = time.time()
 
-    # Create a Progress instance for this file
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TimeElapsedColumn()
-    ) as progress:
-        task_id = progress.add_task(f"Processing {os.path.basename(file_path)}", total=1.0)
-        foldername, filename, description = generate_text_metadata(text, file_path, progress, task_id, text_inference)
+    foldername, filename, description = generate_text_metadata(text, file_path, progress, task_id, text_inference, output=output)
 
     end_time = time.time()
     time_taken = end_time - start_time
@@ -40,8 +109,8 @@ def process_single_text_file(args, text_inference, silent=False, log_file=None):
     message = f"File: {file_path}\nTime taken: {time_taken:.2f} seconds\nDescription: {description}\nFolder name: {foldername}\nGenerated filename: {filename}\n"
     if silent:
         if log_file:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+            # log_file is the handle main() opened once for the whole run
+            log_file.write(message + '\n')
     else:
         print(message)
     return {
@@ -51,22 +120,37 @@ def process_single_text_file(args, text_inference, silent=False, log_file=None):
         'description': description
     }
 
-def process_text_files(text_tuples, text_inference, silent=False, log_file=None):
-    """Process text files sequentially."""
+def process_text_files(text_tuples, text_inference, silent=False, log_file=None, batch_size=TEXT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    """Process text files in batches of concurrent Ollama requests."""
+    # generate_batch's ThreadPoolExecutor raises ValueError for a negative max_workers
+    concurrency = max(1, concurrency)
     results = []
-    for args in text_tuples:
-        data = process_single_text_file(args, text_inference, silent=silent, log_file=log_file)
-        results.append(data)
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TimeElapsedColumn()
+    ) as progress:
+        for start in range(0, len(text_tuples), batch_size):
+            batch = text_tuples[start:start + batch_size]
+            batch_start_time = time.time()
+            task_ids = [progress.add_task(f"Processing {os.path.basename(file_path)}", total=1.0) for file_path, _ in batch]
+            outputs = text_inference.generate_batch([_metadata_prompt(text) for _, text in batch], max_workers=concurrency)
+            for args, task_id, output in zip(batch, task_ids, outputs):
+                try:
+                    results.append(process_single_text_file(args, text_inference, progress, task_id, silent=silent, log_file=log_file, output=output, start_time=batch_start_time))
+                finally:
+                    # Drop finished tasks so the display only shows the files in flight
+                    progress.remove_task(task_id)
     return results
 
-def generate_text_metadata(input_text, file_path, progress, task_id, text_inference):
-    """Generate description, folder name, and filename for a text document."""
-
-    # Total steps in processing a text file
-    total_steps = 1
-
-    # Step 1: Generate description, folder name, and filename in one go
-    prompt = f"""Analyze the following text and provide a concise description, a suitable folder name (max 2 words, nouns only), and a descriptive filename (max 3 words, nouns only, underscores for spaces). Return the output as a JSON object with keys 'description', 'foldername', and 'filename'.
+def _metadata_prompt(input_text):
+    """Return the prompt asking for a description, folder name, and filename in one go."""
+    # Prefill time grows with prompt length; the start and end of a long
+    # document are enough to name it
+    if len(input_text) > MAX_PROMPT_CHARS:
+        half = MAX_PROMPT_CHARS // 2
+        input_text = input_text[:half] + "\n...\n" + input_text[-half:]
+    return f"""Analyze the following text and provide a concise description, a suitable folder name (max 2 words, nouns only), and a descriptive filename (max 3 words, nouns only, underscores for spaces). Return the output as a JSON object with keys 'description', 'foldername', and 'filename'.
 
 Example:
 Text: This document discusses the principles of quantum mechanics and its applications.
@@ -75,72 +159,52 @@ JSON Output: {{ "description": "Principles and applications of quantum mechanics
 Text: {input_text}
 
 JSON Output:"""
-    output = text_inference.generate(prompt).strip()
-    # Extract JSON string using regex
-    json_match = re.search(r'\{.*\}', output, re.DOTALL)
-    if json_match:
-        json_string = json_match.group(0)
-        output_dict = json.loads(json_string)
-    else:
+
+def generate_text_metadata(input_text, file_path, progress, task_id, text_inference, output=None):
+    """Generate description, folder name, and filename for a text document.
+
+    The raw model output can be passed in when it was already generated as
+    part of a batch.
+    """
+
+    # Total steps in processing a text file
+    total_steps = 1
+
+    # Step 1: Generate description, folder name, and filename in one go
+    if output is None:
+        output = text_inference.generate(_metadata_prompt(input_text))
+    output = output.strip()
+    # Extract the JSON object: the outermost braces via a plain scan
+    start = output.find('{')
+    end = output.rfind('}')
+    if start == -1 or end < start:
         raise ValueError(f"Could not find JSON in model output: {output}")
+    try:
+        output_dict = json.loads(output[start:end + 1])
+    except json.JSONDecodeError:
+        # Braces in text after the object spoil the slice; decode just the first object
+        output_dict, _ = _JSON_DECODER.raw_decode(output, start)
     description = output_dict['description']
     foldername = output_dict['foldername']
     filename = output_dict['filename']
 
     progress.update(task_id, advance=1 / total_steps)
 
-    # Remove unwanted words and stopwords
-    unwanted_words = set([
-        'the', 'and', 'based', 'generated', 'this', 'is', 'filename', 'file', 'document', 'text', 'output', 'only', 'below', 'category',
-        'summary', 'key', 'details', 'information', 'note', 'notes', 'main', 'ideas', 'concepts', 'in', 'on', 'of', 'with', 'by', 'for',
-        'to', 'from', 'a', 'an', 'as', 'at', 'i', 'we', 'you', 'they', 'he', 'she', 'it', 'that', 'which', 'are', 'were', 'was', 'be',
-        'have', 'has', 'had', 'do', 'does', 'did', 'but', 'if', 'or', 'because', 'about', 'into', 'through', 'during', 'before', 'after',
-        'above', 'below', 'any', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so',
-        'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now', 'new', 'depicts', 'show', 'shows', 'display',
-        'illustrates', 'presents', 'features', 'provides', 'covers', 'includes', 'discusses', 'demonstrates', 'describes'
-    ])
-    stop_words = set(stopwords.words('english'))
-    all_unwanted_words = unwanted_words.union(stop_words)
-    lemmatizer = WordNetLemmatizer()
-
-    # Function to clean and process the AI output
-    def clean_ai_output(text, max_words):
-        # Remove special characters and numbers
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\d+', '', text)
-        text = text.strip()
-        # Split concatenated words (e.g., 'mathOperations' -> 'math Operations')
-        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-        # Tokenize and lemmatize words
-        words = word_tokenize(text)
-        words = [word.lower() for word in words if word.isalpha()]
-        words = [lemmatizer.lemmatize(word) for word in words]
-        # Remove unwanted words and duplicates
-        filtered_words = []
-        seen = set()
-        for word in words:
-            if word not in all_unwanted_words and word not in seen:
-                filtered_words.append(word)
-                seen.add(word)
-        # Limit to max words
-        filtered_words = filtered_words[:max_words]
-        return '_'.join(filtered_words)
-
     # Process filename
-    filename = clean_ai_output(filename, max_words=3)
+    filename = _clean_ai_output(filename, max_words=3)
     if not filename or filename.lower() in ('untitled', ''):
         # Use keywords from the description
-        filename = clean_ai_output(description, max_words=3)
+        filename = _clean_ai_output(description, max_words=3)
     if not filename:
         filename = 'document_' + os.path.splitext(os.path.basename(file_path))[0]
 
     sanitized_filename = sanitize_filename(filename, max_words=3)
 
     # Process foldername
-    foldername = clean_ai_output(foldername, max_words=2)
+    foldername = _clean_ai_output(foldername, max_words=2)
     if not foldername or foldername.lower() in ('untitled', ''):
         # Attempt to extract keywords from the description
-        foldername = clean_ai_output(description, max_words=2)
+        foldername = _clean_ai_output(description, max_words=2)
         if not foldername:
             foldername = 'documents'
 